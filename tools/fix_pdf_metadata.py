@@ -4,28 +4,33 @@ Fix PDF metadata in LaTeX file before compilation.
 Adds pdftitle and pdfauthor to \hypersetup command.
 """
 
-import re
 import sys
 
 
 def fix_pdf_metadata(tex_file: str) -> None:
     """Add PDF title and author metadata to LaTeX file."""
-    with open(tex_file, 'r', encoding='utf-8') as f:
+    with open(tex_file, 'rb') as f:
         content = f.read()
     
-    # Find \hypersetup{ and add pdftitle and pdfauthor if not present
-    pattern = r'(\\hypersetup\{)'
-    replacement = r'\1\n      pdftitle={Assignment 1},\n      pdfauthor={Onat Dalmaz},\n'
-    
     # Check if already has pdftitle
-    if 'pdftitle={Assignment 1}' not in content:
-        content = re.sub(pattern, replacement, content, count=1)
-        
-        with open(tex_file, 'w', encoding='utf-8') as f:
-            f.write(content)
-        print(f"Added PDF metadata to {tex_file}")
-    else:
+    if b'pdftitle={Assignment 1}' in content:
         print(f"PDF metadata already present in {tex_file}")
+        return
+    
+    # Find \hypersetup{ and add pdftitle and pdfauthor right after it
+    marker = b'\\hypersetup{'
+    idx = content.find(marker)
+    if idx == -1:
+        print(f"No \\hypersetup found in {tex_file}")
+        return
+    
+    end = idx + len(marker)
+    insert = b'\n      pdftitle={Assignment 1},\n      pdfauthor={Onat Dalmaz},\n'
+    content = content[:end] + insert + content[end:]
+    
+    with open(tex_file, 'wb') as f:
+        f.write(content)
+    print(f"Added PDF metadata to {tex_file}")
 
 
 if __name__ == '__main__':
@@ -3,103 +3,222 @@
 Sanitize Jupyter notebook for LaTeX PDF export.
 Fix Unicode characters that break LaTeX and normalize math delimiters
 in markdown so nbconvert keeps math in math mode.
+If $LATEX_SANITIZE_CACHE names a directory, sanitized output is cached
+there keyed by content hash; the cache is never pruned.
 """
 
+import hashlib
 import json
+import os
+import re
+import shutil
 import sys
+from typing import Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Unicode characters that actually break LaTeX compilation
+_UNICODE_FIXES = {
+    0x00A0: ' ',  # NBSP
+    0x2018: "'",  # left single quote
+    0x2019: "'",  # right single quote
+    0x201C: '"',  # left double quote
+    0x201D: '"',  # right double quote
+    0x2013: '-',  # en dash
+    0x2014: '-',  # em dash
+    0x2026: '...',  # ellipsis
+    0x2192: '->',  # →
+    0x21D2: '=>',  # ⇒
+    0x21A6: '|->',  # ↦
+    0x2212: '-',  # minus
+    0x200B: '',  # zero-width space
+    0x200C: '',  # zero-width non-joiner
+    0x200D: '',  # zero-width joiner
+    0xFEFF: '',  # zero-width no-break space
+}
+_TRANS = str.maketrans(_UNICODE_FIXES)
+
+# Matches anything the sanitizer could rewrite; cells without a hit are skipped
+_NEEDS_FIX_RE = re.compile(
+    '[' + re.escape(''.join(map(chr, _UNICODE_FIXES))) + ']' + r'|\\[()\[\]]'
+)
+
+# Byte-level counterpart for the raw notebook file: UTF-8 lead bytes of the
+# fixed code points, JSON-escaped \( \) \[ \], and \u escapes. It may give
+# false positives (e.g. in code cells) but never misses a fixable cell.
+_NEEDS_FIX_BYTES_RE = re.compile(rb'[\xc2\xe2\xef]|\\\\[][()]|\\u')
+_CHUNK_SIZE = 1 << 20
+
+# 19+ digit runs may be integers beyond 64 bits, which orjson turns into floats
+_LONG_INT_RE = re.compile(rb'\d{19}')
+
+# Opt-in: caching is disabled unless this is set
+_CACHE_DIR = os.environ.get('LATEX_SANITIZE_CACHE', '')
+
+# Code spans are captured so they can be passed through; bare delimiters are
+# rewritten. An unterminated fence runs to the end of the text, and an
+# unterminated inline span stops at the next fence, as fences take precedence.
+_MATH_RE = re.compile(
+    r'(```.*?(?:```|\Z)|`[^`]*(?:`(?!``)|(?=```)|\Z))|\\\[|\\\]|\\\(|\\\)',
+    re.DOTALL
+)
+_DELIMITERS = {'\\[': '$$', '\\]': '$$', '\\(': '$', '\\)': '$'}
+
+
+def _replace_delimiter(match: re.Match) -> str:
+    if match.group(1) is not None:
+        # Inside fenced or inline code; leave unchanged.
+        return match.group(0)
+    return _DELIMITERS[match.group(0)]
 
 
 def _convert_math_delimiters(text: str) -> str:
     r"""Convert \( \) and \[ \] to $ and $$ outside code blocks."""
-    parts = text.split("```")
-    for i, part in enumerate(parts):
-        if i % 2 == 1:
-            # Inside fenced code block; leave unchanged.
-            continue
-        subparts = part.split("`")
-        for j, sub in enumerate(subparts):
-            if j % 2 == 1:
-                # Inside inline code; leave unchanged.
-                continue
-            sub = sub.replace(r"\[", "$$")
-            sub = sub.replace(r"\]", "$$")
-            sub = sub.replace(r"\(", "$")
-            sub = sub.replace(r"\)", "$")
-            subparts[j] = sub
-        parts[i] = "`".join(subparts)
-    return "```".join(parts)
+    return _MATH_RE.sub(_replace_delimiter, text)
 
 
-def sanitize_notebook(input_path: str, output_path: str) -> None:
-    """Sanitize a Jupyter notebook for LaTeX export."""
-    with open(input_path, 'r', encoding='utf-8') as f:
-        nb = json.load(f)
-    
-    # Fix Unicode characters that actually break LaTeX compilation
-    unicode_fixes = {
-        '\u00A0': ' ',  # NBSP
-        '\u2018': "'",  # left single quote
-        '\u2019': "'",  # right single quote
-        '\u201C': '"',  # left double quote
-        '\u201D': '"',  # right double quote
-        '\u2013': '-',  # en dash
-        '\u2014': '-',  # em dash
-        '\u2026': '...',  # ellipsis
-        '\u2192': '->',  # →
-        '\u21D2': '=>',  # ⇒
-        '\u21A6': '|->',  # ↦
-        '\u2212': '-',  # minus
-        '\u200B': '',  # zero-width space
-        '\u200C': '',  # zero-width non-joiner
-        '\u200D': '',  # zero-width joiner
-        '\uFEFF': '',  # zero-width no-break space
-    }
-    
+def sanitize_text(text: str) -> str:
+    """Apply the Unicode and math delimiter fixes to markdown text.
+
+    Returns ``text`` itself when it contains nothing to fix.
+    """
+    if not _NEEDS_FIX_RE.search(text):
+        return text
+    return _convert_math_delimiters(text.translate(_TRANS))
+
+
+def _may_need_fix(path: str) -> bool:
+    """Scan the raw notebook bytes for anything sanitize_text could rewrite."""
+    tail = b''
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(_CHUNK_SIZE)
+            if not chunk:
+                return False
+            # Carry over the last bytes so matches spanning chunks are found
+            buf = tail + chunk
+            if _NEEDS_FIX_BYTES_RE.search(buf):
+                return True
+            tail = buf[-2:]
+
+
+def _load_notebook(path: str) -> Tuple[dict, bool]:
+    """Parse a notebook; also return whether orjson was used.
+
+    orjson handles only the inputs it can round-trip exactly, so NaN, lone
+    surrogates and integers that may exceed 64 bits fall back to stdlib json.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if orjson is not None and not _LONG_INT_RE.search(data):
+        try:
+            return orjson.loads(data), True
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(data), False
+
+
+def _dump_notebook(nb: dict, path: str, use_orjson: bool) -> None:
+    """Serialize a notebook compactly with the library that parsed it."""
+    # The output is only read by nbconvert, so skip indentation
+    if use_orjson:
+        data = orjson.dumps(nb)
+    else:
+        try:
+            data = json.dumps(nb, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        except UnicodeEncodeError:
+            # Lone surrogates cannot be written as UTF-8; keep them as \u escapes
+            data = json.dumps(nb, separators=(',', ':')).encode('ascii')
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def _sanitize_cells(nb: dict) -> bool:
+    """Sanitize all markdown cells in place; return whether any changed."""
     changed = False
-    # Process all markdown cells
     for cell in nb.get('cells', []):
-        if cell.get('cell_type') == 'markdown':
-            source = cell.get('source', [])
+        if cell.get('cell_type') != 'markdown':
+            continue
+        source = cell.get('source', [])
+        if isinstance(source, list):
+            original = ''.join(source)
+        elif isinstance(source, str):
+            original = source
+        else:
+            continue
+        text = sanitize_text(original)
+        # A pre-check hit is taken as a change, avoiding a full comparison
+        if text is not original:
             if isinstance(source, list):
-                # Preserve the original list structure - each item is a line or part of a line
-                # Join to get full text, fix Unicode, then reconstruct preserving structure
-                original_text = ''.join(source)
-                text = original_text
-                for uchar, replacement in unicode_fixes.items():
-                    text = text.replace(uchar, replacement)
-                text = _convert_math_delimiters(text)
-                if text != original_text:
-                    # Reconstruct the list structure by splitting on newlines
-                    # and preserving how the original was structured
-                    lines = text.split('\n')
-                    result = []
-                    for i, line in enumerate(lines):
-                        result.append(line)
-                        # Add newline as separate item (matching Jupyter's format)
-                        if i < len(lines) - 1:
-                            result.append('\n')
-                    # If original ended with newline, preserve that
-                    if original_text.endswith('\n') and not text.endswith('\n'):
-                        result.append('\n')
-                    cell['source'] = result
-                    changed = True
-            elif isinstance(source, str):
-                original = source
-                for uchar, replacement in unicode_fixes.items():
-                    source = source.replace(uchar, replacement)
-                source = _convert_math_delimiters(source)
-                if source != original:
-                    cell['source'] = source
-                    changed = True
+                # One line per item, newlines kept (matching Jupyter's format)
+                cell['source'] = text.splitlines(keepends=True)
+            else:
+                cell['source'] = text
+            changed = True
+    return changed
+
+
+def _cache_key(path: str) -> str:
+    """Hash the input together with this script, so editing either invalidates."""
+    h = hashlib.sha256()
+    for name in (__file__, path):
+        with open(name, 'rb') as f:
+            for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+                h.update(chunk)
+    return h.hexdigest()
+
+
+def _copy_file(src: str, dst: str) -> None:
+    try:
+        shutil.copyfile(src, dst)
+    except shutil.SameFileError:
+        pass
+
+
+def _store_in_cache(output_path: str, cached: str) -> None:
+    """Best-effort copy of a sanitized notebook into the cache."""
+    tmp = f'{cached}.{os.getpid()}.tmp'
+    try:
+        os.makedirs(_CACHE_DIR, exist_ok=True)
+        shutil.copyfile(output_path, tmp)
+        # Atomic, so concurrent builds never see a partial entry
+        os.replace(tmp, cached)
+    except OSError:
+        pass
+
+
+def sanitize_notebook(input_path: str, output_path: str) -> None:
+    """Sanitize a Jupyter notebook for LaTeX export."""
+    # Only parse the notebook if the raw bytes contain something fixable
+    if not _may_need_fix(input_path):
+        _copy_file(input_path, output_path)
+        print(f"Notebook copied to: {output_path} (no changes needed)")
+        return
     
-    # Write sanitized notebook
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(nb, f, ensure_ascii=False, indent=1)
+    cached = None
+    if _CACHE_DIR:
+        cached = os.path.join(_CACHE_DIR, _cache_key(input_path) + '.ipynb')
+        if os.path.exists(cached):
+            _copy_file(cached, output_path)
+            print(f"Sanitized notebook written to: {output_path} (from cache)")
+            return
     
-    if changed:
+    nb, use_orjson = _load_notebook(input_path)
+    if _sanitize_cells(nb):
+        # Write sanitized notebook
+        _dump_notebook(nb, output_path, use_orjson)
         print(f"Sanitized notebook written to: {output_path} (Unicode + math delimiter fixes)")
     else:
+        # Nothing was rewritten, so the input bytes are already the output
+        _copy_file(input_path, output_path)
         print(f"Notebook copied to: {output_path} (no changes needed)")
+    
+    if cached is not None:
+        _store_in_cache(output_path, cached)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,51 @@
+import math
+import os
+import tempfile
+import unittest
+
+from latex_sanitize_notebook import _convert_math_delimiters, _load_notebook
+
+
+class TestConvertMathDelimiters(unittest.TestCase):
+    def test_delimiters(self):
+        self.assertEqual(_convert_math_delimiters(r"\(x\) and \[y\]"),
+                         "$x$ and $$y$$")
+
+    def test_code_untouched(self):
+        text = "`\\(a\\)`\n```\n\\[b\\]\n```\n\\(c\\)"
+        self.assertEqual(_convert_math_delimiters(text),
+                         "`\\(a\\)`\n```\n\\[b\\]\n```\n$c$")
+
+    def test_unterminated_fence(self):
+        text = "\\(a\\)\n```\n\\(b\\)"
+        self.assertEqual(_convert_math_delimiters(text),
+                         "$a$\n```\n\\(b\\)")
+
+    def test_stray_backtick_before_fence(self):
+        # An unterminated inline span must stop at the fence
+        text = "Type the ` key:\n```\nprint(1)\n```\nThen \\(x^2\\) is shown."
+        self.assertEqual(_convert_math_delimiters(text),
+                         "Type the ` key:\n```\nprint(1)\n```\nThen $x^2$ is shown.")
+
+
+class TestLoadNotebook(unittest.TestCase):
+    def load(self, data: bytes) -> dict:
+        fd, path = tempfile.mkstemp(suffix='.ipynb')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            nb, _ = _load_notebook(path)
+            return nb
+        finally:
+            os.remove(path)
+
+    def test_inputs_only_stdlib_accepts(self):
+        nb = self.load(b'{"big": 123456789012345678901234567890, "nan": NaN,'
+                       b' "s": "\\udc00"}')
+        self.assertEqual(nb['big'], 123456789012345678901234567890)
+        self.assertTrue(math.isnan(nb['nan']))
+        self.assertEqual(nb['s'], '\udc00')
+
+
+if __name__ == '__main__':
+    unittest.main()